@@ -2,10 +2,6 @@ class HTTPStatusCodeError(Exception):
     """Пользовательское исключение."""
 
     def __init__(self, status_code) -> None:
-        """."""
-        super().__init__(status_code)
+        """Формирует сообщение об ошибке один раз."""
+        super().__init__(f'Ошибка {status_code}')
         self.status_code = status_code
-
-    def __str__(self) -> str:
-        """Сообщение об ошибке."""
-        return f'Ошибка {self.status_code}'
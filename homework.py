@@ -1,14 +1,19 @@
+import json
 import logging
 import os
 import sys
 import time
-from http import HTTPStatus
 from json import JSONDecodeError
+from logging.handlers import RotatingFileHandler
+
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 
 from telegram import Bot
 from telegram import TelegramError
+from telegram.utils.request import Request
 
 from dotenv import load_dotenv
 
@@ -20,19 +25,35 @@ load_dotenv()
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s, %(levelname)s, %(message)s',
-    handlers=[logging.FileHandler('main.log',
-                                  encoding='utf-8', mode='w'),
+    handlers=[RotatingFileHandler('main.log', maxBytes=1_000_000,
+                                  backupCount=3, encoding='utf-8'),
               logging.StreamHandler(sys.stdout)])
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+log = logging.getLogger('homework_bot')
 
 PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
+_TOKEN_NAMES = ('PRACTICUM_TOKEN', 'TELEGRAM_TOKEN', 'TELEGRAM_CHAT_ID')
+
 RETRY_TIME = 600
+MIN_RETRY_TIME = 60
+MAX_RETRY_TIME = 3600
+TELEGRAM_MESSAGE_LIMIT = 4000
+REQUEST_TIMEOUT = (3.05, 10)
+_OK_STATUSES = frozenset({200, 304})
 N_SEC_WEEK = 604800
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
 
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+_COND_HEADERS = {}
+_LAST_PAYLOAD = None
+
 
 HOMEWORK_STATUSES = {
     'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
@@ -40,14 +61,60 @@ HOMEWORK_STATUSES = {
     'rejected': 'Работа проверена: у ревьюера есть замечания.'
 }
 
+_STATUS_TEMPLATE = 'Изменился статус проверки работы "{}". {}'.format
+
+LAST_STATUS_FILE = 'last_status.json'
+LAST_STATUS = {}
+
+
+def load_last_status():
+    """Читает сохранённые статусы работ из файла.
+    Позволяет после перезапуска бота не отправлять
+    в чат уже известные статусы повторно.
+    """
+    try:
+        with open(LAST_STATUS_FILE, encoding='utf-8') as source:
+            LAST_STATUS.update(json.load(source))
+    except FileNotFoundError:
+        log.debug('Файл со статусами работ ещё не создан')
+    except (OSError, JSONDecodeError):
+        log.error('Не удалось прочитать сохранённые статусы работ')
+
+
+def save_last_status():
+    """Сохраняет известные статусы работ в файл."""
+    try:
+        with open(LAST_STATUS_FILE, 'w', encoding='utf-8') as target:
+            json.dump(LAST_STATUS, target, ensure_ascii=False)
+    except OSError:
+        log.error('Не удалось сохранить статусы работ')
+
 
 def send_message(bot, message):
-    """Отправка сообщений от бота."""
+    """Отправка сообщений от бота.
+    Возвращает True, если сообщение доставлено.
+    """
     try:
         bot.send_message(TELEGRAM_CHAT_ID, message)
-        logging.info(f'Сообщение в чат {TELEGRAM_CHAT_ID}: {message}')
     except TelegramError:
-        logging.error(f'Ошибка отправки в чат {TELEGRAM_CHAT_ID}: {message}')
+        log.error('Ошибка отправки в чат %s: %s',
+                  TELEGRAM_CHAT_ID, message)
+        return False
+    log.info('Сообщение в чат %s: %s', TELEGRAM_CHAT_ID, message)
+    return True
+
+
+def _remember_validators(response):
+    """Запоминает валидаторы кеша из заголовков ответа.
+    На следующем опросе они уходят в условный GET,
+    чтобы сервер мог ответить 304 без тела.
+    """
+    etag = response.headers.get('ETag')
+    if etag:
+        _COND_HEADERS['If-None-Match'] = etag
+    last_modified = response.headers.get('Last-Modified')
+    if last_modified:
+        _COND_HEADERS['If-Modified-Since'] = last_modified
 
 
 def get_api_answer(current_timestamp):
@@ -55,23 +122,37 @@ def get_api_answer(current_timestamp):
     В качестве параметра функция получает временную метку.
     В случае успешного запроса должна вернуть ответ API,
     преобразовав его из формата JSON к типам данных Python.
+    На ответ 304 возвращает закешированный предыдущий ответ.
     """
+    global _LAST_PAYLOAD
     params = {'from_date': current_timestamp}
+    headers = {**HEADERS, **_COND_HEADERS} if _COND_HEADERS else HEADERS
     try:
-        homework_units = requests.get(ENDPOINT, headers=HEADERS,
-                                      params=params)
-    except ConnectionError as e:
-        logging.error(f'Сбой в работе программы: Я.Практикум недоступен: {e}')
-        raise ConnectionError(f'Сбой в работе программы: '
-                              f'Я.Практикум недоступен: {e}')
-    if homework_units.status_code != HTTPStatus.OK:
-        logging.error(f'Ошибка {homework_units.status_code}')
-        raise HTTPStatusCodeError
+        homework_units = SESSION.get(ENDPOINT, headers=headers,
+                                     params=params, timeout=REQUEST_TIMEOUT)
+    except requests.Timeout as e:
+        log.error('Сбой в работе программы: Я.Практикум не ответил '
+                  'за отведённое время: %s', e)
+        raise
+    except requests.ConnectionError as e:
+        log.error('Сбой в работе программы: Я.Практикум недоступен: %s', e)
+        raise
+    if homework_units.status_code not in _OK_STATUSES:
+        log.error('Ошибка %s', homework_units.status_code)
+        raise HTTPStatusCodeError(homework_units.status_code)
+    if homework_units.status_code == 304:
+        if _LAST_PAYLOAD is not None:
+            return _LAST_PAYLOAD
+        _COND_HEADERS.clear()
+        log.error('Ответ 304 без закешированных данных')
+        raise HTTPStatusCodeError(homework_units.status_code)
     try:
-        return homework_units.json()
-    except JSONDecodeError:
-        logging.error('Сервер вернул невалидный json')
-        raise JSONDecodeError('Сервер вернул невалидный json')
+        _LAST_PAYLOAD = orjson.loads(homework_units.content)
+    except orjson.JSONDecodeError:
+        log.error('Сервер вернул невалидный json')
+        raise
+    _remember_validators(homework_units)
+    return _LAST_PAYLOAD
 
 
 def check_response(response):
@@ -90,7 +171,7 @@ def check_response(response):
     except KeyError:
         raise KeyError('Ошибка по ключу homeworks')
     if not isinstance(works_list, list):
-        logging.error('Не является списком')
+        log.error('Не является списком')
         raise TypeError('Не является списком')
     return works_list
 
@@ -107,12 +188,13 @@ def parse_status(homework):
         raise KeyError('Статус работы "homework_name" неверный')
     if 'status' not in homework:
         raise KeyError('Статус работы "status" неверный')
-    homework_name = homework.get('homework_name')
-    homework_status = homework.get('status')
-    if homework_status not in HOMEWORK_STATUSES:
+    homework_name = homework['homework_name']
+    homework_status = homework['status']
+    try:
+        verdict = HOMEWORK_STATUSES[homework_status]
+    except KeyError:
         raise KeyError(f'Статус работы {homework_status} неверный')
-    verdict = HOMEWORK_STATUSES.get(homework_status)
-    return f'Изменился статус проверки работы "{homework_name}". {verdict}'
+    return _STATUS_TEMPLATE(homework_name, verdict)
 
 
 def check_tokens():
@@ -121,48 +203,116 @@ def check_tokens():
     Если отсутствует хотя бы одна переменная
     окружения — функция должна вернуть False, иначе — True.
     """
-    if not all([PRACTICUM_TOKEN, TELEGRAM_TOKEN, TELEGRAM_CHAT_ID]):
-        tokens = [PRACTICUM_TOKEN,
-                  TELEGRAM_TOKEN,
-                  TELEGRAM_CHAT_ID]
-        for token in tokens:
-            logging.critical(f'Отсутствует обязательный '
-                             f'токен/переменная окружения: {token}. '
-                             f'Программа принудительно остановлена.')
+    missing = [name for name in _TOKEN_NAMES if not globals()[name]]
+    if missing:
+        log.critical(
+            'Отсутствуют обязательные токены/переменные окружения: %s. '
+            'Программа принудительно остановлена.', ', '.join(missing))
         return False
     return True
 
 
+def chunk_messages(verdicts):
+    """Разбивает вердикты на пачки не длиннее лимита Telegram."""
+    chunk = []
+    length = 0
+    for verdict in verdicts:
+        extra = len(verdict) + (2 if chunk else 0)
+        if chunk and length + extra > TELEGRAM_MESSAGE_LIMIT:
+            yield chunk
+            chunk, length = [], 0
+            extra = len(verdict)
+        chunk.append(verdict)
+        length += extra
+    if chunk:
+        yield chunk
+
+
+def process_homeworks(bot, homeworks):
+    """Отправляет сообщения о новых статусах работ.
+    Уже отправленные статусы пропускаются по кешу LAST_STATUS,
+    новые вердикты склеиваются в одно сообщение на опрос.
+    В кеш попадают только реально доставленные статусы.
+    Возвращает True, если хотя бы одно сообщение доставлено.
+    """
+    verdicts = []
+    changed = []
+    for homework in homeworks:
+        key = str(homework.get('id')
+                  or homework.get('homework_name'))
+        if LAST_STATUS.get(key) == homework.get('status'):
+            continue
+        verdicts.append(parse_status(homework))
+        changed.append((key, homework.get('status')))
+    if not verdicts:
+        return False
+    updated = False
+    done = 0
+    for batch in chunk_messages(verdicts):
+        if send_message(bot, '\n\n'.join(batch)):
+            for key, status in changed[done:done + len(batch)]:
+                LAST_STATUS[key] = status
+            updated = True
+        done += len(batch)
+    if updated:
+        save_last_status()
+    return updated
+
+
+def report_failure(bot, error, last_error):
+    """Логирует сбой и шлёт его в чат, если он ещё не отправлялся.
+    Возвращает текст сбоя для дедупликации на следующей итерации.
+    """
+    message = f'Сбой в работе программы: {error}'
+    log.error(message)
+    if message != last_error:
+        send_message(bot, message)
+    return message
+
+
 def main():
     """Основная логика работы бота."""
-    logging.debug('бот включился')
+    log.debug('бот включился')
 
     if not check_tokens():
-        logging.info('работа бота остановлена')
-        exit()
+        log.info('работа бота остановлена')
+        sys.exit(1)
 
-    bot = Bot(token=TELEGRAM_TOKEN)
+    bot = Bot(token=TELEGRAM_TOKEN,
+              request=Request(connect_timeout=5.0, read_timeout=10.0))
+    load_last_status()
     current_timestamp = int(time.time()) - N_SEC_WEEK
+    last_error = None
+    interval = RETRY_TIME
     while True:
         try:
             response = get_api_answer(current_timestamp)
             homeworks = check_response(response)
+            updated = False
             if len(homeworks) != 0:
-                for homework in homeworks:
-                    send_message(bot, parse_status(homework))
+                updated = process_homeworks(bot, homeworks)
+            else:
+                log.info('Отсутсвует работа или список работ')
+            if updated:
+                interval = MIN_RETRY_TIME
+            elif not homeworks:
+                interval = min(interval * 2, MAX_RETRY_TIME)
             else:
-                logging.info('Отсутсвует работа или список работ')
+                interval = RETRY_TIME
             if 'current_date' not in response:
                 raise KeyError('Текущая дата не обнаружена')
             current_timestamp = response.get('current_date')
-        except SystemError as error:
-            message = f'Сбой в работе программы: {error}'
-            logging.error(message)
-            if error:
-                send_message(bot, message)
-                continue
+            last_error = None
+        except (requests.RequestException, HTTPStatusCodeError) as error:
+            interval = min(interval * 2, MAX_RETRY_TIME)
+            log.error('Сбой в работе программы: %s', error)
+            continue
+        except (TelegramError, JSONDecodeError,
+                KeyError, TypeError) as error:
+            last_error = report_failure(bot, error, last_error)
+            continue
         finally:
-            time.sleep(RETRY_TIME)
+            time.sleep(interval)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,7 @@
+import json
 import os
 from http import HTTPStatus
 
-import requests
 import telegram
 import utils
 
@@ -44,6 +44,7 @@ class MockResponseGET:
         )
         self.random_timestamp = random_timestamp
         self.status_code = http_status
+        self.headers = {}
 
     def json(self):
         data = {
@@ -52,6 +53,10 @@ class MockResponseGET:
         }
         return data
 
+    @property
+    def content(self):
+        return json.dumps(self.json()).encode('utf-8')
+
 
 class MockTelegramBot:
 
@@ -186,7 +191,7 @@ class TestHomework:
                 current_timestamp=current_timestamp, **kwargs
             )
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -232,7 +237,7 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_500_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_500_response_get)
 
         import homework
 
@@ -315,7 +320,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -352,7 +357,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -400,7 +405,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -448,7 +453,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -484,7 +489,7 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_no_homeworks_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_no_homeworks_response_get)
 
         import homework
 
@@ -525,7 +530,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -565,7 +570,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -599,7 +604,7 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_empty_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_empty_response_get)
 
         import homework
 
@@ -626,7 +631,7 @@ class TestHomework:
             )
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 